@@ -0,0 +1,116 @@
+import argparse
+import asyncio
+import time
+
+from line_protocol import open_connection
+
+
+async def run_mock_chat_server(lines_count, line_length, oversized_line_length):
+    line = b'x' * (line_length - 1) + b'\n'
+    oversized_line = b'y' * oversized_line_length + b'\n'
+    batch = line * 100
+
+    async def handle_client(reader, writer):
+        try:
+            if oversized_line_length:
+                writer.write(oversized_line)
+            for _ in range(lines_count // 100):
+                writer.write(batch)
+                await writer.drain()
+            writer.write(line * (lines_count % 100))
+            await writer.drain()
+        except ConnectionError:
+            # the client gave up on the oversized line
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle_client, host='127.0.0.1', port=0)
+
+
+async def read_with_stream_reader(host, port, lines_count):
+    reader, writer = await asyncio.open_connection(host=host, port=port)
+
+    received_lines_count = 0
+    try:
+        while received_lines_count < lines_count:
+            line = await reader.readline()
+            if not line:
+                break
+            received_lines_count += 1
+    finally:
+        writer.close()
+
+    return received_lines_count
+
+
+async def read_with_line_protocol(host, port, lines_count):
+    reader, writer = await open_connection(host=host, port=port)
+
+    received_lines_count = 0
+    try:
+        while received_lines_count < lines_count:
+            lines = await reader.readlines()
+            if not lines:
+                break
+            received_lines_count += len(lines)
+    finally:
+        writer.close()
+
+    return received_lines_count
+
+
+async def measure(read_function, server, lines_count):
+    host, port = server.sockets[0].getsockname()[:2]
+
+    started_at = time.perf_counter()
+    try:
+        received_lines_count = await read_function(host, port, lines_count)
+    except ValueError as e:
+        return f'failed: {e!r}'
+    elapsed_time = time.perf_counter() - started_at
+
+    return (
+        f'{received_lines_count} lines in {elapsed_time:.3f}s '
+        f'({received_lines_count / elapsed_time:,.0f} lines/s)'
+    )
+
+
+def get_command_line_arguments():
+    parser = argparse.ArgumentParser(
+        description='Compare StreamReader.readline() with the line protocol reader',
+    )
+    parser.add_argument('--lines', type=int, default=500000, help='Default: 500000')
+    parser.add_argument('--line-length', type=int, default=80, help='Default: 80')
+    parser.add_argument(
+        '--oversized-line-length',
+        type=int,
+        default=0,
+        help='Send one line of the given length first to check large-line safety. '
+             'Default: 0 (disabled)',
+    )
+    return parser.parse_args()
+
+
+async def main():
+    command_line_arguments = get_command_line_arguments()
+
+    lines_count = command_line_arguments.lines
+    expected_lines_count = lines_count + bool(command_line_arguments.oversized_line_length)
+
+    server = await run_mock_chat_server(
+        lines_count=lines_count,
+        line_length=command_line_arguments.line_length,
+        oversized_line_length=command_line_arguments.oversized_line_length,
+    )
+    async with server:
+        for title, read_function in (
+                ('StreamReader.readline', read_with_stream_reader),
+                ('LineReaderProtocol.readlines', read_with_line_protocol),
+        ):
+            result = await measure(read_function, server, expected_lines_count)
+            print(f'{title:30} {result}')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,117 @@
+import argparse
+import random
+import string
+import time
+
+from message_filters import MessageFilter
+
+
+def generate_word(randomizer, min_length=4, max_length=10):
+    length = randomizer.randint(min_length, max_length)
+    return ''.join(randomizer.choice(string.ascii_lowercase) for _ in range(length))
+
+
+def generate_messages(randomizer, keywords, messages_count, words_count=12, mention_rate=0.05):
+    messages = []
+
+    for _ in range(messages_count):
+        words = [generate_word(randomizer) for _ in range(words_count)]
+        if randomizer.random() < mention_rate:
+            words[randomizer.randrange(words_count)] = randomizer.choice(keywords)
+        messages.append(f'{generate_word(randomizer)}: {" ".join(words)}')
+
+    return messages
+
+
+def add_overlapping_keywords(randomizer, watchlist, keywords, rate=0.1):
+    actions = list(watchlist)
+
+    # parts of other keywords under another action, so that matches overlap
+    for keyword in randomizer.sample(keywords, int(len(keywords) * rate)):
+        start = randomizer.randrange(len(keyword) - 3)
+        end = randomizer.randrange(start + 4, len(keyword) + 1)
+        watchlist[randomizer.choice(actions)].append(keyword[start:end])
+
+    # a keyword inside own nickname
+    watchlist['mute'].append('nick')
+
+
+def apply_per_pattern_loop(keywords_actions, text):
+    text = text.lower()
+    actions = set()
+
+    for keyword, keyword_actions in keywords_actions:
+        if keyword in text:
+            actions.update(keyword_actions)
+
+    return actions
+
+
+def get_command_line_arguments():
+    parser = argparse.ArgumentParser(
+        description='Compare the compiled message filter with a per-pattern loop',
+    )
+    parser.add_argument('--patterns', type=int, default=5000, help='Default: 5000')
+    parser.add_argument('--messages', type=int, default=20000, help='Default: 20000')
+    parser.add_argument('--seed', type=int, default=0, help='Default: 0')
+    return parser.parse_args()
+
+
+def main():
+    command_line_arguments = get_command_line_arguments()
+    randomizer = random.Random(command_line_arguments.seed)
+
+    keywords = list({
+        generate_word(randomizer, min_length=5)
+        for _ in range(command_line_arguments.patterns)
+    })
+    watchlist = {
+        'highlight': keywords[0::3],
+        'mute': keywords[1::3],
+        'route': keywords[2::3],
+    }
+    add_overlapping_keywords(randomizer, watchlist, keywords)
+    messages = generate_messages(
+        randomizer, keywords + ['nickname'], command_line_arguments.messages,
+    )
+
+    started_at = time.perf_counter()
+    message_filter = MessageFilter.from_watchlist(watchlist)
+    message_filter.set_nickname('nickname')
+    compile_time = time.perf_counter() - started_at
+
+    keywords_actions = [
+        (keyword, {action}) for action, keywords in watchlist.items() for keyword in keywords
+    ]
+    keywords_actions.append(('nickname', {'highlight'}))
+
+    started_at = time.perf_counter()
+    compiled_results = [message_filter.apply(message) for message in messages]
+    compiled_time = time.perf_counter() - started_at
+
+    started_at = time.perf_counter()
+    loop_results = [apply_per_pattern_loop(keywords_actions, message) for message in messages]
+    loop_time = time.perf_counter() - started_at
+
+    mismatches_count = sum(
+        (bool(compiled.highlights), compiled.muted, compiled.routed) !=
+        ('highlight' in loop, 'mute' in loop, 'route' in loop)
+        for compiled, loop in zip(compiled_results, loop_results)
+    )
+
+    messages_count = len(messages)
+    print(f'{len(keywords_actions)} patterns, {messages_count} messages')
+    print(f'compiling matcher          {compile_time:.3f}s')
+    print(
+        f'compiled matcher           {compiled_time:.3f}s '
+        f'({messages_count / compiled_time:,.0f} messages/s)',
+    )
+    print(
+        f'per-pattern loop           {loop_time:.3f}s '
+        f'({messages_count / loop_time:,.0f} messages/s)',
+    )
+    print(f'mismatched results         {mismatches_count}')
+
+
+if __name__ == '__main__':
+    main()
@@ -2,6 +2,7 @@ import asyncio
 import datetime
 import logging
 import json
+import multiprocessing
 import os.path
 import sys
 import socket
@@ -10,12 +11,19 @@ from tkinter import messagebox
 
 from aiofile import AIOFile
 from async_timeout import timeout
-from aionursery import MultiError
 import configargparse
 
 import gui_chat_client as gui
 from gui_common import TkAppClosed
-from utils import create_handy_nursery, get_sanitized_text
+from line_protocol import open_connection
+from message_filters import MessageFilter
+from process_bridge import receive_to_queues, send_queues_to_connection
+from rate_limiting import MessageThrottler
+import traffic_capture
+from utils import (
+    RestartPolicy, create_supervisor, get_sanitized_text, parse_positive_float,
+    parse_positive_int,
+)
 
 
 watchdog_logger = logging.getLogger('watchdog')
@@ -25,6 +33,10 @@ class InvalidToken(Exception):
     pass
 
 
+class EngineProcessStopped(Exception):
+    pass
+
+
 async def load_json_data(filepath):
     if not os.path.exists(filepath):
         return None
@@ -52,6 +64,35 @@ async def save_messages(output_filepath, messages_queue):
             await write_to_file(file_object=file_object, text=message)
 
 
+async def save_capture(output_filepath, traffic_recorder):
+    if os.path.exists(output_filepath):
+        os.remove(output_filepath)
+
+    async with AIOFile(output_filepath, 'ab') as file_object:
+        await file_object.write(traffic_capture.CAPTURE_FILE_HEADER)
+
+        while True:
+            records = [await traffic_recorder.records_queue.get()]
+            while not traffic_recorder.records_queue.empty():
+                records.append(traffic_recorder.records_queue.get_nowait())
+
+            await file_object.write(b''.join(records))
+
+
+async def filter_messages(
+        messages_queue, filtered_messages_queue, routed_messages_queue, message_filter):
+    while True:
+        message = await messages_queue.get()
+
+        filtered_message = message_filter.apply(message)
+
+        if filtered_message.routed:
+            routed_messages_queue.put_nowait(f'{message}\n')
+
+        if not filtered_message.muted:
+            filtered_messages_queue.put_nowait(filtered_message)
+
+
 async def watch_for_connection(
         watchdog_messages_queue, max_pending_time_between_messages=4):
     while True:
@@ -74,34 +115,55 @@ async def watch_for_connection(
 
 async def run_chat_reader(
         host, port, displayed_messages_queue, written_to_file_messages_queue,
-        status_updates_queue, watchdog_messages_queue, successful_connection_info_queue):
+        status_updates_queue, watchdog_messages_queue, successful_connection_info_queue,
+        traffic_recorder=None):
     status_updates_queue.put_nowait(gui.ReadConnectionStateChanged.INITIATED)
 
-    reader, writer = await asyncio.open_connection(host=host, port=port)
+    reader, writer = await open_connection(
+        host=host,
+        port=port,
+        on_data_received=traffic_recorder.get_recording_callback(
+            traffic_capture.READ_CONNECTION_RECEIVED,
+        ) if traffic_recorder else None,
+    )
 
     try:
         status_updates_queue.put_nowait(gui.ReadConnectionStateChanged.ESTABLISHED)
         successful_connection_info_queue.put_nowait(True)
 
         while True:
-            message = await reader.readline()
+            messages = await reader.readlines()
+
+            if not messages:
+                raise ConnectionError('Connection closed by server')
 
-            displayed_messages_queue.put_nowait(f'{message.decode().strip()}')
-            written_to_file_messages_queue.put_nowait(f'{message.decode()}')
-            watchdog_messages_queue.put_nowait('New message in chat')
+            for message in messages:
+                message = message.decode(errors='replace')
+
+                displayed_messages_queue.put_nowait(message.strip())
+                written_to_file_messages_queue.put_nowait(message)
+            watchdog_messages_queue.put_nowait(f'{len(messages)} new messages in chat')
     finally:
         writer.close()
         status_updates_queue.put_nowait(gui.ReadConnectionStateChanged.CLOSED)
 
 
+async def read_response(reader):
+    response = await reader.readline()
+
+    if not response:
+        raise ConnectionError('Connection closed by server')
+    return response
+
+
 async def authorise(reader, writer, auth_token, watchdog_messages_queue):
-    greeting_message = await reader.readline()
+    greeting_message = await read_response(reader)
     watchdog_messages_queue.put_nowait('Prompt before auth')
 
     writer.write(f'{auth_token}\n'.encode())
     await writer.drain()
 
-    user_credentials_message = await reader.readline()
+    user_credentials_message = await read_response(reader)
     watchdog_messages_queue.put_nowait('Authorisation done')
 
     user_credentials = json.loads(user_credentials_message.decode())
@@ -109,24 +171,26 @@ async def authorise(reader, writer, auth_token, watchdog_messages_queue):
     if user_credentials is None:
         return None
 
-    welcome_to_chat_message = await reader.readline()
+    welcome_to_chat_message = await read_response(reader)
     watchdog_messages_queue.put_nowait('Welcome to chat message received')
 
     return user_credentials
 
 
-async def send_message(reader, writer, message, watchdog_messages_queue):
+async def send_message(reader, writer, message, watchdog_messages_queue, sending_lock):
     sending_message = f'{get_sanitized_text(message)}\n\n' if message else '\n'
 
-    writer.write(sending_message.encode())
-    await writer.drain()
+    # each message waits for its own confirmation before the next one is sent
+    async with sending_lock:
+        writer.write(sending_message.encode())
+        await writer.drain()
 
-    successfully_sent_message = await reader.readline()
+        successfully_sent_message = await read_response(reader)
     watchdog_messages_queue.put_nowait('Message sent')
 
 
 async def send_empty_messages(
-        reader, writer, watchdog_messages_queue,
+        reader, writer, watchdog_messages_queue, sending_lock,
         timeout_between_sending_messages=2):
     while True:
         await send_message(
@@ -134,30 +198,54 @@ async def send_empty_messages(
             writer=writer,
             message='',
             watchdog_messages_queue=watchdog_messages_queue,
+            sending_lock=sending_lock,
         )
         await asyncio.sleep(timeout_between_sending_messages)
 
 
+def report_sending_queue_state(status_updates_queue, message_throttler):
+    status_updates_queue.put_nowait(
+        gui.SendingQueueStateChanged(
+            pending_messages_count=len(message_throttler.pending_messages),
+            estimated_delay=message_throttler.get_estimated_delay(),
+        ),
+    )
+
+
 async def send_messages(
-        reader, writer, sending_messages_queue, watchdog_messages_queue):
+        reader, writer, sending_messages_queue, watchdog_messages_queue,
+        status_updates_queue, message_throttler, sending_lock):
     while True:
-        message = await sending_messages_queue.get()
+        if not message_throttler.pending_messages:
+            message_throttler.add(await sending_messages_queue.get())
 
-        if message:
-            await send_message(
-                reader=reader,
-                writer=writer,
-                message=message,
-                watchdog_messages_queue=watchdog_messages_queue,
-            )
+        while not sending_messages_queue.empty():
+            message_throttler.add(sending_messages_queue.get_nowait())
+
+        if not message_throttler.pending_messages:
+            continue
+
+        message_throttler.coalesce_if_throttled()
+        report_sending_queue_state(status_updates_queue, message_throttler)
+
+        message = await message_throttler.take()
+        await send_message(
+            reader=reader,
+            writer=writer,
+            message=message,
+            watchdog_messages_queue=watchdog_messages_queue,
+            sending_lock=sending_lock,
+        )
+        report_sending_queue_state(status_updates_queue, message_throttler)
 
 
 async def run_chat_writer(
         host, port, auth_token, sending_messages_queue, status_updates_queue,
-        watchdog_messages_queue, successful_connection_info_queue):
+        watchdog_messages_queue, successful_connection_info_queue, message_filter,
+        message_throttler, traffic_recorder=None):
     status_updates_queue.put_nowait(gui.SendingConnectionStateChanged.INITIATED)
 
-    reader, writer = await asyncio.open_connection(host=host, port=port)
+    reader, writer = await open_connection(host=host, port=port)
 
     try:
         status_updates_queue.put_nowait(gui.SendingConnectionStateChanged.ESTABLISHED)
@@ -175,22 +263,39 @@ async def run_chat_writer(
         status_updates_queue.put_nowait(
             gui.NicknameReceived(user_credentials["nickname"]),
         )
+        # compiling a large watchlist takes long enough to starve the watchdog
+        await asyncio.to_thread(message_filter.set_nickname, user_credentials["nickname"])
+
+        if traffic_recorder:
+            # the authorisation exchange carries the token, so recording
+            # starts after it and the exchange is stored without the token
+            traffic_recorder.record_redacted_authorisation(
+                stream=traffic_capture.WRITE_CONNECTION_RECEIVED,
+                user_credentials=user_credentials,
+            )
+            reader.on_data_received = traffic_recorder.get_recording_callback(
+                traffic_capture.WRITE_CONNECTION_RECEIVED,
+            )
 
-        async with create_handy_nursery() as nursery:
-            nursery.start_soon(
-                send_messages(
-                    reader=reader,
-                    writer=writer,
-                    sending_messages_queue=sending_messages_queue,
-                    watchdog_messages_queue=watchdog_messages_queue,
-                ),
+        sending_lock = asyncio.Lock()
+
+        async with create_supervisor() as supervisor:
+            supervisor.start_soon(
+                send_messages,
+                reader=reader,
+                writer=writer,
+                sending_messages_queue=sending_messages_queue,
+                watchdog_messages_queue=watchdog_messages_queue,
+                status_updates_queue=status_updates_queue,
+                message_throttler=message_throttler,
+                sending_lock=sending_lock,
             )
-            nursery.start_soon(
-                send_empty_messages(
-                    reader=reader,
-                    writer=writer,
-                    watchdog_messages_queue=watchdog_messages_queue,
-                ),
+            supervisor.start_soon(
+                send_empty_messages,
+                reader=reader,
+                writer=writer,
+                watchdog_messages_queue=watchdog_messages_queue,
+                sending_lock=sending_lock,
             )
     finally:
         writer.close()
@@ -243,14 +348,67 @@ def get_command_line_arguments():
         type=str,
         default='chat.txt',
     )
+    parser.add_argument(
+        '--watchlist',
+        help='Path to the JSON file with lists of keywords for "highlight", "mute" '
+             'and "route" actions. Mentions of own nickname are always highlighted',
+        env_var='CHAT_WATCHLIST_FILEPATH',
+        type=str,
+        default='',
+    )
+    parser.add_argument(
+        '--routed-output',
+        help='Filepath for save chat messages matched by "route" keywords. '
+             'Default: chat_routed.txt',
+        env_var='CHAT_ROUTED_MESSAGES_OUTPUT_FILEPATH',
+        type=str,
+        default='chat_routed.txt',
+    )
+    parser.add_argument(
+        '--capture',
+        help='Filepath for record raw traffic of chat connections with receive '
+             'timestamps. It can be replayed with replay_capture.py',
+        env_var='CHAT_CAPTURE_FILEPATH',
+        type=str,
+        default='',
+    )
+    parser.add_argument(
+        '--separate-process',
+        help='Run connections and saving messages in a separate process, '
+             'so a busy window does not stall them',
+        env_var='CHAT_SEPARATE_PROCESS',
+        action='store_true',
+    )
+    parser.add_argument(
+        '--send-rate',
+        help='Max count of sent messages per second on average. Default: 1',
+        env_var='CHAT_SEND_RATE',
+        type=parse_positive_float,
+        default=1,
+    )
+    parser.add_argument(
+        '--send-burst',
+        help='Max count of messages sent at once without waiting. Default: 5',
+        env_var='CHAT_SEND_BURST',
+        type=parse_positive_int,
+        default=5,
+    )
+    parser.add_argument(
+        '--max-message-length',
+        help='Max length of one sent message. Longer and multi-line messages are split, '
+             'small ones waiting to be sent are merged. Default: 400',
+        env_var='CHAT_MAX_MESSAGE_LENGTH',
+        type=parse_positive_int,
+        default=400,
+    )
     return parser.parse_args()
 
 
 async def handle_connection(
         host, read_port, write_port, auth_token, displayed_messages_queue,
         written_to_file_messages_queue, sending_messages_queue,
-        status_updates_queue, connection_attempts_count_without_timeout=2,
-        timeout_between_connection_attempts=2):
+        status_updates_queue, message_filter, message_throttler, traffic_recorder=None,
+        connection_attempts_count_without_timeout=2, timeout_between_connection_attempts=2):
     watchdog_messages_queue = asyncio.Queue()
     chat_reader_successful_connection_info_queue = asyncio.Queue()
     chat_writer_successful_connection_info_queue = asyncio.Queue()
@@ -261,40 +419,37 @@ async def handle_connection(
         try:
             current_connection_attempt += 1
 
-            async with create_handy_nursery() as nursery:
-                nursery.start_soon(
-                    run_chat_reader(
-                        host=host,
-                        port=read_port,
-                        displayed_messages_queue=displayed_messages_queue,
-                        written_to_file_messages_queue=written_to_file_messages_queue,
-                        status_updates_queue=status_updates_queue,
-                        watchdog_messages_queue=watchdog_messages_queue,
-                        successful_connection_info_queue=chat_reader_successful_connection_info_queue,
-                    ),
+            async with create_supervisor() as supervisor:
+                supervisor.start_soon(
+                    run_chat_reader,
+                    host=host,
+                    port=read_port,
+                    displayed_messages_queue=displayed_messages_queue,
+                    written_to_file_messages_queue=written_to_file_messages_queue,
+                    status_updates_queue=status_updates_queue,
+                    watchdog_messages_queue=watchdog_messages_queue,
+                    successful_connection_info_queue=chat_reader_successful_connection_info_queue,
+                    traffic_recorder=traffic_recorder,
                 )
-                nursery.start_soon(
-                    run_chat_writer(
-                        host=host,
-                        port=write_port,
-                        auth_token=auth_token,
-                        sending_messages_queue=sending_messages_queue,
-                        status_updates_queue=status_updates_queue,
-                        watchdog_messages_queue=watchdog_messages_queue,
-                        successful_connection_info_queue=chat_writer_successful_connection_info_queue,
-                    ),
+                supervisor.start_soon(
+                    run_chat_writer,
+                    host=host,
+                    port=write_port,
+                    auth_token=auth_token,
+                    sending_messages_queue=sending_messages_queue,
+                    status_updates_queue=status_updates_queue,
+                    watchdog_messages_queue=watchdog_messages_queue,
+                    successful_connection_info_queue=chat_writer_successful_connection_info_queue,
+                    message_filter=message_filter,
+                    message_throttler=message_throttler,
+                    traffic_recorder=traffic_recorder,
                 )
-                nursery.start_soon(
-                    watch_for_connection(
-                        watchdog_messages_queue=watchdog_messages_queue,
-                    ),
+                supervisor.start_soon(
+                    watch_for_connection,
+                    watchdog_messages_queue=watchdog_messages_queue,
                 )
             return
-        except MultiError as e:
-            for exc in e.exceptions:
-                if not isinstance(exc, socket.gaierror):
-                    raise
-        except (ConnectionError, socket.gaierror):
+        except* (ConnectionError, socket.gaierror):
             pass
 
         if (not chat_reader_successful_connection_info_queue.empty() and
@@ -311,15 +466,192 @@ async def handle_connection(
             await asyncio.sleep(timeout_between_connection_attempts)
 
 
+def setup_watchdog_logger():
+    watchdog_logger.setLevel(level=logging.INFO)
+    console_handler = logging.StreamHandler()
+    console_handler.setLevel(level=logging.INFO)
+    console_handler.setFormatter(logging.Formatter('%(name)s:%(levelname)s:%(message)s'))
+    watchdog_logger.addHandler(console_handler)
+
+
+async def run_engine(
+        command_line_arguments, auth_token, filtered_messages_queue,
+        sending_messages_queue, status_updates_queue):
+    watchlist_filepath = command_line_arguments.watchlist
+    capture_filepath = command_line_arguments.capture
+
+    watchlist = await load_json_data(watchlist_filepath) if watchlist_filepath else None
+    message_filter = await asyncio.to_thread(MessageFilter.from_watchlist, watchlist or {})
+
+    message_throttler = MessageThrottler(
+        rate=command_line_arguments.send_rate,
+        burst=command_line_arguments.send_burst,
+        max_message_length=command_line_arguments.max_message_length,
+    )
+
+    displayed_messages_queue = asyncio.Queue()
+    routed_messages_queue = asyncio.Queue()
+    written_to_file_messages_queue = asyncio.Queue()
+
+    traffic_recorder = traffic_capture.TrafficRecorder() if capture_filepath else None
+
+    async with create_supervisor() as supervisor:
+        supervisor.start_soon(
+            handle_connection,
+            host=command_line_arguments.host,
+            read_port=command_line_arguments.read_port,
+            write_port=command_line_arguments.write_port,
+            auth_token=auth_token,
+            displayed_messages_queue=displayed_messages_queue,
+            written_to_file_messages_queue=written_to_file_messages_queue,
+            sending_messages_queue=sending_messages_queue,
+            status_updates_queue=status_updates_queue,
+            message_filter=message_filter,
+            message_throttler=message_throttler,
+            traffic_recorder=traffic_recorder,
+        )
+        supervisor.start_soon(
+            filter_messages,
+            messages_queue=displayed_messages_queue,
+            filtered_messages_queue=filtered_messages_queue,
+            routed_messages_queue=routed_messages_queue,
+            message_filter=message_filter,
+        )
+        supervisor.start_soon(
+            save_messages,
+            output_filepath=command_line_arguments.output,
+            messages_queue=written_to_file_messages_queue,
+            restart_policy=RestartPolicy(restart_on=(OSError,), delay=1),
+        )
+        if message_filter.has_routes:
+            supervisor.start_soon(
+                save_messages,
+                output_filepath=command_line_arguments.routed_output,
+                messages_queue=routed_messages_queue,
+                restart_policy=RestartPolicy(restart_on=(OSError,), delay=1),
+            )
+        if traffic_recorder:
+            supervisor.start_soon(
+                save_capture,
+                output_filepath=capture_filepath,
+                traffic_recorder=traffic_recorder,
+            )
+
+
+async def run_engine_over_connection(connection, command_line_arguments, auth_token):
+    filtered_messages_queue = asyncio.Queue()
+    sending_messages_queue = asyncio.Queue()
+    status_updates_queue = asyncio.Queue()
+
+    try:
+        async with create_supervisor() as supervisor:
+            supervisor.start_soon(
+                run_engine,
+                command_line_arguments=command_line_arguments,
+                auth_token=auth_token,
+                filtered_messages_queue=filtered_messages_queue,
+                sending_messages_queue=sending_messages_queue,
+                status_updates_queue=status_updates_queue,
+            )
+            supervisor.start_soon(
+                send_queues_to_connection,
+                connection=connection,
+                queues={
+                    'display': filtered_messages_queue,
+                    'status': status_updates_queue,
+                },
+            )
+            await receive_to_queues(
+                connection=connection,
+                queues={'send': sending_messages_queue},
+            )
+            # the GUI process is closed
+            supervisor.cancel()
+    except* InvalidToken:
+        # exception classes of the main module can not be unpickled
+        # in the other process, so the error is passed by its name
+        connection.send([('errors', 'invalid_token')])
+    except* BrokenPipeError:
+        pass
+
+
+def run_engine_process(connection, command_line_arguments, auth_token):
+    setup_watchdog_logger()
+
+    try:
+        asyncio.run(
+            run_engine_over_connection(
+                connection=connection,
+                command_line_arguments=command_line_arguments,
+                auth_token=auth_token,
+            ),
+        )
+    except KeyboardInterrupt:
+        pass
+    finally:
+        connection.close()
+
+
+async def run_gui_with_engine_process(
+        command_line_arguments, auth_token, max_engine_process_stopping_time=2):
+    context = multiprocessing.get_context('spawn')
+    connection, engine_connection = context.Pipe()
+
+    engine_process = context.Process(
+        target=run_engine_process,
+        kwargs={
+            'connection': engine_connection,
+            'command_line_arguments': command_line_arguments,
+            'auth_token': auth_token,
+        },
+        daemon=True,
+    )
+    engine_process.start()
+    engine_connection.close()
+
+    filtered_messages_queue = asyncio.Queue()
+    sending_messages_queue = asyncio.Queue()
+    status_updates_queue = asyncio.Queue()
+    errors_queue = asyncio.Queue()
+
+    try:
+        async with create_supervisor() as supervisor:
+            supervisor.start_soon(
+                gui.draw,
+                messages_queue=filtered_messages_queue,
+                sending_queue=sending_messages_queue,
+                status_updates_queue=status_updates_queue,
+            )
+            supervisor.start_soon(
+                send_queues_to_connection,
+                connection=connection,
+                queues={'send': sending_messages_queue},
+            )
+            await receive_to_queues(
+                connection=connection,
+                queues={
+                    'display': filtered_messages_queue,
+                    'status': status_updates_queue,
+                    'errors': errors_queue,
+                },
+            )
+
+            if not errors_queue.empty() and errors_queue.get_nowait() == 'invalid_token':
+                raise InvalidToken()
+            raise EngineProcessStopped()
+    finally:
+        connection.close()
+
+        await asyncio.to_thread(engine_process.join, max_engine_process_stopping_time)
+        if engine_process.is_alive():
+            engine_process.terminate()
+
+
 async def main():
     command_line_arguments = get_command_line_arguments()
 
-    chat_host = command_line_arguments.host
-    chat_read_port = command_line_arguments.read_port
-    chat_write_port = command_line_arguments.write_port
     user_credentials_filepath = command_line_arguments.credentials
     chat_auth_token = command_line_arguments.token
-    output_filepath = command_line_arguments.output
 
     if not chat_auth_token:
         user_credentials = await load_json_data(user_credentials_filepath)
@@ -329,42 +661,33 @@ async def main():
 
         chat_auth_token = user_credentials['account_hash']
 
-    displayed_messages_queue = asyncio.Queue()
-    written_to_file_messages_queue = asyncio.Queue()
+    if command_line_arguments.separate_process:
+        await run_gui_with_engine_process(
+            command_line_arguments=command_line_arguments,
+            auth_token=chat_auth_token,
+        )
+        return
+
+    filtered_messages_queue = asyncio.Queue()
     sending_messages_queue = asyncio.Queue()
     status_updates_queue = asyncio.Queue()
 
-    watchdog_logger.setLevel(level=logging.INFO)
-    console_handler = logging.StreamHandler()
-    console_handler.setLevel(level=logging.INFO)
-    console_handler.setFormatter(logging.Formatter('%(name)s:%(levelname)s:%(message)s'))
-    watchdog_logger.addHandler(console_handler)
+    setup_watchdog_logger()
 
-    async with create_handy_nursery() as nursery:
-        nursery.start_soon(
-            handle_connection(
-                host=chat_host,
-                read_port=chat_read_port,
-                write_port=chat_write_port,
-                auth_token=chat_auth_token,
-                displayed_messages_queue=displayed_messages_queue,
-                written_to_file_messages_queue=written_to_file_messages_queue,
-                sending_messages_queue=sending_messages_queue,
-                status_updates_queue=status_updates_queue,
-            ),
+    async with create_supervisor() as supervisor:
+        supervisor.start_soon(
+            run_engine,
+            command_line_arguments=command_line_arguments,
+            auth_token=chat_auth_token,
+            filtered_messages_queue=filtered_messages_queue,
+            sending_messages_queue=sending_messages_queue,
+            status_updates_queue=status_updates_queue,
         )
-        nursery.start_soon(
-            gui.draw(
-                messages_queue=displayed_messages_queue,
-                sending_queue=sending_messages_queue,
-                status_updates_queue=status_updates_queue,
-            ),
-        )
-        nursery.start_soon(
-            save_messages(
-                output_filepath=output_filepath,
-                messages_queue=written_to_file_messages_queue,
-            ),
+        supervisor.start_soon(
+            gui.draw,
+            messages_queue=filtered_messages_queue,
+            sending_queue=sending_messages_queue,
+            status_updates_queue=status_updates_queue,
         )
 
 
@@ -372,8 +695,12 @@ if __name__ == '__main__':
     loop = asyncio.get_event_loop()
     try:
         loop.run_until_complete(main())
-    except InvalidToken:
+    # several tasks may fail at once, e.g. a lost connection and an invalid token
+    except* InvalidToken:
         messagebox.showerror('Invalid token', 'Unknown token. Check it')
         sys.exit(1)
-    except (KeyboardInterrupt, TkAppClosed):
+    except* EngineProcessStopped:
+        messagebox.showerror('Engine stopped', 'Chat engine process stopped unexpectedly')
+        sys.exit(1)
+    except* (KeyboardInterrupt, TkAppClosed):
         pass
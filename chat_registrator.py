@@ -1,6 +1,9 @@
 import asyncio
+import logging
 import socket
 import json
+import sys
+import time
 from tkinter import messagebox
 
 import configargparse
@@ -9,7 +12,14 @@ from async_timeout import timeout
 
 import gui_chat_registrator as gui
 from gui_common import TkAppClosed
-from utils import create_handy_nursery, get_sanitized_text
+from line_protocol import open_connection
+from utils import (
+    create_supervisor, get_sanitized_text, parse_non_negative_int, parse_positive_float,
+    parse_positive_int,
+)
+
+
+bulk_registration_logger = logging.getLogger('bulk_registration')
 
 
 class UserSuccessfullyRegistered(Exception):
@@ -20,6 +30,24 @@ class UserRegistrationPendingTimeElapsed(Exception):
     pass
 
 
+class BulkRegistrationStats:
+    def __init__(self, nicknames_count):
+        self.nicknames_count = nicknames_count
+        self.registered_count = 0
+        self.failed_nicknames = []
+        self.started_at = time.monotonic()
+
+    def __str__(self):
+        elapsed_time = time.monotonic() - self.started_at
+        throughput = self.registered_count / elapsed_time if elapsed_time else 0
+
+        return (
+            f'Registered {self.registered_count} of {self.nicknames_count} nicknames '
+            f'in {elapsed_time:.2f}s ({throughput:.2f} registrations/s), '
+            f'failed: {len(self.failed_nicknames)}'
+        )
+
+
 async def register(reader, writer, nickname):
     greeting_message = await reader.readline()
 
@@ -67,7 +95,7 @@ async def run_chat_registrator(
         try:
             nickname = await nickname_queue.get()
 
-            reader, writer = await asyncio.open_connection(host=host, port=port)
+            reader, writer = await open_connection(host=host, port=port)
 
             user_credentials = await execute_user_registration(
                 reader=reader,
@@ -101,6 +129,121 @@ async def run_chat_registrator(
             register_button_state_queue.put_nowait('normal')
 
 
+async def load_nicknames(input_filepath):
+    if input_filepath == '-':
+        text = sys.stdin.read()
+    else:
+        async with AIOFile(input_filepath) as file_object:
+            text = await file_object.read()
+
+    return [nickname for nickname in map(str.strip, text.splitlines()) if nickname]
+
+
+# credentials are whatever the server answers, so the end of them is marked
+# with an object that can never come from json.loads
+_END_OF_USER_CREDENTIALS = object()
+
+
+async def save_bulk_user_credentials(output_filepath, user_credentials_queue):
+    async with AIOFile(output_filepath, 'a') as file_object:
+        while True:
+            user_credentials = await user_credentials_queue.get()
+
+            if user_credentials is _END_OF_USER_CREDENTIALS:
+                return
+
+            # every record goes out with a single write to a file opened in
+            # append mode, so lines from different runs never interleave
+            await file_object.write(f'{json.dumps(user_credentials)}\n')
+            await file_object.fsync()
+
+
+async def register_nickname(host, port, nickname, attempt_timeout, attempts_count):
+    for attempt in range(1, attempts_count + 1):
+        writer = None
+        try:
+            async with timeout(attempt_timeout):
+                reader, writer = await open_connection(host=host, port=port)
+
+                user_credentials = await register(
+                    reader=reader,
+                    writer=writer,
+                    nickname=nickname,
+                )
+
+            if not isinstance(user_credentials, dict) or 'account_hash' not in user_credentials:
+                raise ValueError(f'Unexpected registration response: {user_credentials!r}')
+            return user_credentials
+        except (OSError, asyncio.TimeoutError, ValueError) as e:
+            bulk_registration_logger.debug(
+                f'Attempt {attempt} to register {nickname!r} failed: {e!r}',
+            )
+            error = e
+        finally:
+            if writer:
+                writer.close()
+
+    raise error
+
+
+async def run_bulk_registration_worker(
+        host, port, nicknames_queue, user_credentials_queue, stats,
+        attempt_timeout, attempts_count):
+    while not nicknames_queue.empty():
+        nickname = nicknames_queue.get_nowait()
+
+        try:
+            user_credentials = await register_nickname(
+                host=host,
+                port=port,
+                nickname=nickname,
+                attempt_timeout=attempt_timeout,
+                attempts_count=attempts_count,
+            )
+        except (OSError, asyncio.TimeoutError, ValueError) as e:
+            stats.failed_nicknames.append(nickname)
+            bulk_registration_logger.warning(f'Could not register {nickname!r}: {e!r}')
+            continue
+
+        stats.registered_count += 1
+        user_credentials_queue.put_nowait(user_credentials)
+
+
+async def run_bulk_registration(
+        host, port, input_filepath, output_filepath, concurrency,
+        attempt_timeout, retries):
+    nicknames = await load_nicknames(input_filepath)
+
+    nicknames_queue = asyncio.Queue()
+    for nickname in nicknames:
+        nicknames_queue.put_nowait(nickname)
+
+    user_credentials_queue = asyncio.Queue()
+    stats = BulkRegistrationStats(nicknames_count=len(nicknames))
+
+    async with create_supervisor() as supervisor:
+        supervisor.start_soon(
+            save_bulk_user_credentials,
+            output_filepath=output_filepath,
+            user_credentials_queue=user_credentials_queue,
+        )
+        async with create_supervisor() as workers_supervisor:
+            for _ in range(min(concurrency, len(nicknames))):
+                workers_supervisor.start_soon(
+                    run_bulk_registration_worker,
+                    host=host,
+                    port=port,
+                    nicknames_queue=nicknames_queue,
+                    user_credentials_queue=user_credentials_queue,
+                    stats=stats,
+                    attempt_timeout=attempt_timeout,
+                    attempts_count=retries + 1,
+                )
+        user_credentials_queue.put_nowait(_END_OF_USER_CREDENTIALS)
+
+    return stats
+
+
 def get_command_line_arguments():
     parser = configargparse.ArgumentParser()
 
@@ -125,12 +268,79 @@ def get_command_line_arguments():
         type=str,
         default='user_credentials.json',
     )
+    parser.add_argument(
+        '--bulk-input',
+        help='Path to the file with nicknames (one per line) for headless bulk '
+             'registration. Use "-" to read nicknames from stdin',
+        env_var='BULK_NICKNAMES_FILEPATH',
+        type=str,
+        default='',
+    )
+    parser.add_argument(
+        '--bulk-output',
+        help='Filepath for append registered user credentials in bulk mode (JSON Lines). '
+             'Default: user_credentials.jsonl',
+        env_var='BULK_USER_CREDENTIALS_FILEPATH',
+        type=str,
+        default='user_credentials.jsonl',
+    )
+    parser.add_argument(
+        '--concurrency',
+        help='Max count of simultaneous connections in bulk mode. Default: 10',
+        env_var='BULK_CONCURRENCY',
+        type=parse_positive_int,
+        default=10,
+    )
+    parser.add_argument(
+        '--attempt-timeout',
+        help='Max pending time in seconds of one registration attempt in bulk mode. '
+             'Default: 5',
+        env_var='BULK_ATTEMPT_TIMEOUT',
+        type=parse_positive_float,
+        default=5,
+    )
+    parser.add_argument(
+        '--retries',
+        help='Count of retries of failed registration in bulk mode. Default: 2',
+        env_var='BULK_RETRIES',
+        type=parse_non_negative_int,
+        default=2,
+    )
     return parser.parse_args()
 
 
+async def run_bulk_mode(command_line_arguments):
+    bulk_registration_logger.setLevel(level=logging.INFO)
+    console_handler = logging.StreamHandler()
+    console_handler.setLevel(level=logging.INFO)
+    console_handler.setFormatter(logging.Formatter('%(name)s:%(levelname)s:%(message)s'))
+    bulk_registration_logger.addHandler(console_handler)
+
+    stats = await run_bulk_registration(
+        host=command_line_arguments.host,
+        port=command_line_arguments.port,
+        input_filepath=command_line_arguments.bulk_input,
+        output_filepath=command_line_arguments.bulk_output,
+        concurrency=command_line_arguments.concurrency,
+        attempt_timeout=command_line_arguments.attempt_timeout,
+        retries=command_line_arguments.retries,
+    )
+    bulk_registration_logger.info(stats)
+
+    if stats.failed_nicknames:
+        bulk_registration_logger.info(
+            f'Failed nicknames: {", ".join(stats.failed_nicknames)}',
+        )
+        sys.exit(1)
+
+
 async def main():
     command_line_arguments = get_command_line_arguments()
 
+    if command_line_arguments.bulk_input:
+        await run_bulk_mode(command_line_arguments)
+        return
+
     chat_host = command_line_arguments.host
     chat_port = command_line_arguments.port
     user_credentials_output_filepath = command_line_arguments.output
@@ -138,21 +348,19 @@ async def main():
     nickname_queue = asyncio.Queue()
     register_button_state_queue = asyncio.Queue()
 
-    async with create_handy_nursery() as nursery:
-        nursery.start_soon(
-            gui.draw(
-                nickname_queue=nickname_queue,
-                register_button_state_queue=register_button_state_queue,
-            ),
+    async with create_supervisor() as supervisor:
+        supervisor.start_soon(
+            gui.draw,
+            nickname_queue=nickname_queue,
+            register_button_state_queue=register_button_state_queue,
         )
-        nursery.start_soon(
-            run_chat_registrator(
-                host=chat_host,
-                port=chat_port,
-                nickname_queue=nickname_queue,
-                register_button_state_queue=register_button_state_queue,
-                user_credentials_output_filepath=user_credentials_output_filepath,
-            )
+        supervisor.start_soon(
+            run_chat_registrator,
+            host=chat_host,
+            port=chat_port,
+            nickname_queue=nickname_queue,
+            register_button_state_queue=register_button_state_queue,
+            user_credentials_output_filepath=user_credentials_output_filepath,
         )
 
 
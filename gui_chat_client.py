@@ -3,11 +3,13 @@ from tkinter.scrolledtext import ScrolledText
 from enum import Enum
 
 from gui_common import move_message_to_queue, update_tk, set_window_to_screen_center
-from utils import create_handy_nursery
+from utils import create_supervisor
 
 
 enable_text_autoscrolling = True
 
+HIGHLIGHT_TAG = 'highlight'
+
 
 class ReadConnectionStateChanged(Enum):
     INITIATED = 'connection establishment...'
@@ -32,6 +34,18 @@ class NicknameReceived:
         self.nickname = nickname
 
 
+class SendingQueueStateChanged:
+    def __init__(self, pending_messages_count, estimated_delay):
+        self.pending_messages_count = pending_messages_count
+        self.estimated_delay = estimated_delay
+
+    def __str__(self):
+        return (
+            f'{self.pending_messages_count} messages, '
+            f'~{self.estimated_delay:.0f}s until sent'
+        )
+
+
 def disable_autoscrolling(event):
     global enable_text_autoscrolling
     enable_text_autoscrolling = False
@@ -42,14 +56,39 @@ def enable_autoscrolling(event):
     enable_text_autoscrolling = True
 
 
+def get_tagged_chunks(messages, start_with_newline):
+    chunks = []
+
+    for message in messages:
+        if start_with_newline:
+            chunks.extend(('\n', ()))
+        start_with_newline = True
+
+        position = 0
+        for start, end in message.highlights:
+            chunks.extend((message.text[position:start], ()))
+            chunks.extend((message.text[start:end], (HIGHLIGHT_TAG,)))
+            position = end
+        chunks.extend((message.text[position:], ()))
+
+    return chunks
+
+
 async def update_conversation_history(panel, messages_queue):
     while True:
-        msg = await messages_queue.get()
+        messages = [await messages_queue.get()]
+        while not messages_queue.empty():
+            messages.append(messages_queue.get_nowait())
 
         panel['state'] = 'normal'
-        if panel.index('end-1c') != '1.0':
-            panel.insert('end', '\n')
-        panel.insert('end', msg)
+        # the whole batch with its tags goes to Tk with a single insert call
+        panel.insert(
+            'end',
+            *get_tagged_chunks(
+                messages=messages,
+                start_with_newline=panel.index('end-1c') != '1.0',
+            ),
+        )
 
         if enable_text_autoscrolling:
             panel.yview(tk.END)
@@ -57,11 +96,12 @@ async def update_conversation_history(panel, messages_queue):
 
 
 async def update_status_panel(status_labels, status_updates_queue):
-    nickname_label, read_label, write_label = status_labels
+    nickname_label, read_label, write_label, queue_label = status_labels
 
     read_label['text'] = 'Reading: no connection'
     write_label['text'] = 'Sending: no connection'
     nickname_label['text'] = 'Username: unknown'
+    queue_label['text'] = 'Queue: empty'
 
     while True:
         message = await status_updates_queue.get()
@@ -75,6 +115,12 @@ async def update_status_panel(status_labels, status_updates_queue):
         if isinstance(message, NicknameReceived):
             nickname_label['text'] = f'Username: {message.nickname}'
 
+        if isinstance(message, SendingQueueStateChanged):
+            if message.pending_messages_count:
+                queue_label['text'] = f'Queue: {message}'
+            else:
+                queue_label['text'] = 'Queue: empty'
+
 
 def create_status_panel(root_frame):
     status_frame = tk.Frame(root_frame)
@@ -95,7 +141,11 @@ def create_status_panel(root_frame):
         connections_frame, height=1, fg='grey', font='arial 10', anchor='w')
     status_write_label.pack(side='top', fill=tk.X)
 
-    return nickname_label, status_read_label, status_write_label
+    status_queue_label = tk.Label(
+        connections_frame, height=1, fg='grey', font='arial 10', anchor='w')
+    status_queue_label.pack(side='top', fill=tk.X)
+
+    return nickname_label, status_read_label, status_write_label, status_queue_label
 
 
 async def draw(messages_queue, sending_queue, status_updates_queue):
@@ -126,6 +176,7 @@ async def draw(messages_queue, sending_queue, status_updates_queue):
 
     conversation_panel = ScrolledText(root_frame, wrap='none')
     conversation_panel.pack(side='top', fill='both', expand=True)
+    conversation_panel.tag_config(HIGHLIGHT_TAG, background='yellow')
     conversation_panel.vbar.bind('<Enter>', disable_autoscrolling)
     conversation_panel.vbar.bind('<Leave>', enable_autoscrolling)
 
@@ -133,21 +184,18 @@ async def draw(messages_queue, sending_queue, status_updates_queue):
 
     set_window_to_screen_center(root)
 
-    async with create_handy_nursery() as nursery:
-        nursery.start_soon(
-            update_tk(
-                root_frame=root_frame,
-            ),
+    async with create_supervisor() as supervisor:
+        supervisor.start_soon(
+            update_tk,
+            root_frame=root_frame,
         )
-        nursery.start_soon(
-            update_conversation_history(
-                panel=conversation_panel,
-                messages_queue=messages_queue,
-            ),
+        supervisor.start_soon(
+            update_conversation_history,
+            panel=conversation_panel,
+            messages_queue=messages_queue,
         )
-        nursery.start_soon(
-            update_status_panel(
-                status_labels=status_labels,
-                status_updates_queue=status_updates_queue,
-            ),
+        supervisor.start_soon(
+            update_status_panel,
+            status_labels=status_labels,
+            status_updates_queue=status_updates_queue,
         )
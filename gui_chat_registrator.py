@@ -1,7 +1,7 @@
 import tkinter as tk
 
 from gui_common import update_tk, set_window_to_screen_center
-from utils import create_handy_nursery
+from utils import create_supervisor
 
 
 def handle_register_button_click(button, nickname_input_field, nickname_queue):
@@ -47,15 +47,13 @@ async def draw(nickname_queue, register_button_state_queue):
 
     set_window_to_screen_center(root)
 
-    async with create_handy_nursery() as nursery:
-        nursery.start_soon(
-            update_tk(
-                root_frame=root_frame,
-            ),
+    async with create_supervisor() as supervisor:
+        supervisor.start_soon(
+            update_tk,
+            root_frame=root_frame,
         )
-        nursery.start_soon(
-            handle_button_state(
-                button=register_button,
-                button_state_queue=register_button_state_queue,
-            )
+        supervisor.start_soon(
+            handle_button_state,
+            button=register_button,
+            button_state_queue=register_button_state_queue,
         )
@@ -0,0 +1,214 @@
+import asyncio
+import collections
+import socket
+
+
+def tune_socket(sock, keepalive_idle=10, keepalive_interval=5, keepalive_count=3):
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+
+    # these options are platform specific, so they are set only where they exist
+    if hasattr(socket, 'TCP_KEEPIDLE'):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, keepalive_idle)
+    if hasattr(socket, 'TCP_KEEPINTVL'):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, keepalive_interval)
+    if hasattr(socket, 'TCP_KEEPCNT'):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT, keepalive_count)
+
+
+class LineReaderProtocol(asyncio.Protocol):
+    def __init__(
+            self, max_line_length=64 * 1024, max_pending_lines_count=10000,
+            on_data_received=None):
+        self.max_line_length = max_line_length
+        self.max_pending_lines_count = max_pending_lines_count
+        self.on_data_received = on_data_received
+
+        self.transport = None
+
+        self._buffer = bytearray()
+        self._lines = collections.deque()
+        self._skipping_oversized_line = False
+        self._reading_paused = False
+        self._writing_paused = False
+        self._eof = False
+        self._connection_lost = False
+        self._exception = None
+        self._lines_waiter = None
+        self._drain_waiter = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+        sock = transport.get_extra_info('socket')
+        if sock is not None:
+            tune_socket(sock)
+
+    def data_received(self, data):
+        if self.on_data_received is not None:
+            self.on_data_received(data)
+
+        if self._buffer:
+            self._buffer += data
+            data = self._buffer
+
+        start = 0
+        with memoryview(data) as view:
+            while True:
+                end = data.find(b'\n', start)
+                if end == -1:
+                    break
+
+                if self._skipping_oversized_line:
+                    # tail of the truncated line, it is already delivered
+                    self._skipping_oversized_line = False
+                elif end - start > self.max_line_length:
+                    self._lines.append(
+                        bytes(view[start:start + self.max_line_length]) + b'\n',
+                    )
+                else:
+                    self._lines.append(bytes(view[start:end + 1]))
+                start = end + 1
+
+            if len(data) - start > self.max_line_length:
+                if not self._skipping_oversized_line:
+                    self._lines.append(
+                        bytes(view[start:start + self.max_line_length]) + b'\n',
+                    )
+                    self._skipping_oversized_line = True
+                start = len(data)
+
+            if data is self._buffer:
+                view.release()
+                del self._buffer[:start]
+            elif start < len(data):
+                self._buffer += view[start:]
+
+        if len(self._lines) >= self.max_pending_lines_count and not self._reading_paused:
+            self._reading_paused = True
+            self.transport.pause_reading()
+
+        self._wakeup_lines_waiter()
+
+    def eof_received(self):
+        self._eof = True
+        self._wakeup_lines_waiter()
+
+    def connection_lost(self, exc):
+        self._eof = True
+        self._connection_lost = True
+        self._exception = exc
+        self._wakeup_lines_waiter()
+
+        if self._drain_waiter is not None and not self._drain_waiter.done():
+            if exc is None:
+                self._drain_waiter.set_result(None)
+            else:
+                self._drain_waiter.set_exception(exc)
+
+    def pause_writing(self):
+        self._writing_paused = True
+
+    def resume_writing(self):
+        self._writing_paused = False
+
+        if self._drain_waiter is not None and not self._drain_waiter.done():
+            self._drain_waiter.set_result(None)
+
+    def _wakeup_lines_waiter(self):
+        if self._lines_waiter is not None and not self._lines_waiter.done():
+            self._lines_waiter.set_result(None)
+
+    def _resume_reading_if_drained(self):
+        if self._reading_paused and len(self._lines) < self.max_pending_lines_count:
+            self._reading_paused = False
+            self.transport.resume_reading()
+
+    async def _wait_for_lines(self):
+        if self._lines or self._eof:
+            return
+
+        if self._lines_waiter is not None:
+            raise RuntimeError('Another coroutine is already waiting for incoming lines')
+
+        self._lines_waiter = asyncio.get_running_loop().create_future()
+        try:
+            await self._lines_waiter
+        finally:
+            self._lines_waiter = None
+
+    async def readline(self):
+        await self._wait_for_lines()
+
+        if self._lines:
+            line = self._lines.popleft()
+            self._resume_reading_if_drained()
+            return line
+
+        if self._exception is not None:
+            raise self._exception
+        return b''
+
+    async def readlines(self):
+        await self._wait_for_lines()
+
+        if self._lines:
+            lines = list(self._lines)
+            self._lines.clear()
+            self._resume_reading_if_drained()
+            return lines
+
+        if self._exception is not None:
+            raise self._exception
+        return []
+
+    def _raise_if_connection_lost(self):
+        if self._exception is not None:
+            raise self._exception
+        # the same as StreamWriter does, written data is dropped silently otherwise
+        if self._connection_lost:
+            raise ConnectionResetError('Connection lost')
+
+    async def drain(self):
+        self._raise_if_connection_lost()
+
+        if not self._writing_paused:
+            return
+
+        self._drain_waiter = asyncio.get_running_loop().create_future()
+        try:
+            await self._drain_waiter
+        finally:
+            self._drain_waiter = None
+
+        self._raise_if_connection_lost()
+
+
+class LineWriter:
+    def __init__(self, transport, protocol):
+        self.transport = transport
+        self.protocol = protocol
+
+    def write(self, data):
+        self.transport.write(data)
+
+    async def drain(self):
+        await self.protocol.drain()
+
+    def close(self):
+        self.transport.close()
+
+
+async def open_connection(
+        host, port, max_line_length=64 * 1024, on_data_received=None):
+    loop = asyncio.get_running_loop()
+
+    transport, protocol = await loop.create_connection(
+        lambda: LineReaderProtocol(
+            max_line_length=max_line_length,
+            on_data_received=on_data_received,
+        ),
+        host=host,
+        port=port,
+    )
+    return protocol, LineWriter(transport, protocol)
@@ -0,0 +1,160 @@
+import re
+
+
+HIGHLIGHT = 'highlight'
+MUTE = 'mute'
+ROUTE = 'route'
+
+ACTIONS = (HIGHLIGHT, MUTE, ROUTE)
+
+
+class FilteredMessage:
+    def __init__(self, text, highlights=(), muted=False, routed=False):
+        self.text = text
+        self.highlights = highlights
+        self.muted = muted
+        self.routed = routed
+
+
+def build_trie_pattern(keywords):
+    # a regex built from a trie of keywords shares common prefixes,
+    # so the regex engine checks each position once instead of once per keyword
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    return convert_trie_to_pattern(trie)
+
+
+def convert_trie_to_pattern(node):
+    is_keyword_end = '' in node
+    branches = [
+        re.escape(char) + convert_trie_to_pattern(child)
+        for char, child in sorted(node.items()) if char
+    ]
+
+    if not branches:
+        return ''
+
+    if len(branches) == 1:
+        pattern = branches[0]
+        if is_keyword_end:
+            return f'(?:{pattern})?' if len(pattern) > 1 else f'{pattern}?'
+        return pattern
+
+    pattern = f'(?:{"|".join(branches)})'
+    return f'{pattern}?' if is_keyword_end else pattern
+
+
+class MessageFilter:
+    def __init__(self, highlighted=(), muted=(), routed=()):
+        self._watchlist_keywords_actions = {}
+        self._nickname = None
+
+        for action, keywords in zip(ACTIONS, (highlighted, muted, routed)):
+            for keyword in keywords:
+                self._watchlist_keywords_actions.setdefault(keyword.lower(), set()).add(action)
+
+        self._keywords_actions = self._watchlist_keywords_actions
+        self._matcher = self._compile(self._keywords_actions)
+        self._case_insensitive_pattern = None
+
+    @classmethod
+    def from_watchlist(cls, watchlist):
+        return cls(
+            highlighted=watchlist.get(HIGHLIGHT, ()),
+            muted=watchlist.get(MUTE, ()),
+            routed=watchlist.get(ROUTE, ()),
+        )
+
+    @property
+    def has_routes(self):
+        return any(ROUTE in actions for actions in self._keywords_actions.values())
+
+    def set_nickname(self, nickname):
+        nickname = nickname.lower()
+        if nickname == self._nickname:
+            return
+
+        # it may run in a thread while messages are filtered,
+        # so the new matcher is built aside and swapped at once
+        keywords_actions = dict(self._watchlist_keywords_actions)
+        keywords_actions[nickname] = keywords_actions.get(nickname, set()) | {HIGHLIGHT}
+
+        self._matcher = self._compile(keywords_actions)
+        self._keywords_actions = keywords_actions
+        self._nickname = nickname
+
+    @staticmethod
+    def _compile(keywords_actions):
+        keywords = [keyword for keyword in keywords_actions if keyword]
+
+        if not keywords:
+            return None, {}
+
+        # each keyword is mapped to all keywords it starts with,
+        # because at one position only the longest keyword is matched
+        prefix_keywords_actions = {
+            keyword: [
+                (length, keywords_actions[keyword[:length]])
+                for length in range(1, len(keyword) + 1)
+                if keyword[:length] in keywords_actions
+            ]
+            for keyword in keywords
+        }
+
+        # the lookahead lets matches overlap, so keywords
+        # inside or across other keywords are found too
+        pattern = re.compile(f'(?=({build_trie_pattern(keywords)}))')
+
+        return pattern, prefix_keywords_actions
+
+    def _find_matches(self, pattern, text):
+        lowered_text = text.lower()
+
+        # matching the lowered text is much faster than re.IGNORECASE,
+        # but its spans are usable only if lowering kept the text length
+        if len(lowered_text) == len(text):
+            return pattern.finditer(lowered_text)
+
+        if (self._case_insensitive_pattern is None or
+                self._case_insensitive_pattern[0] is not pattern):
+            self._case_insensitive_pattern = (
+                pattern, re.compile(pattern.pattern, re.IGNORECASE),
+            )
+        return self._case_insensitive_pattern[1].finditer(text)
+
+    def apply(self, text):
+        pattern, prefix_keywords_actions = self._matcher
+
+        if pattern is None:
+            return FilteredMessage(text)
+
+        highlights = []
+        actions = set()
+
+        for match in self._find_matches(pattern, text):
+            start = match.start()
+            keyword = match.group(1).lower()
+
+            for length, keyword_actions in prefix_keywords_actions.get(keyword, ()):
+                actions.update(keyword_actions)
+
+                if HIGHLIGHT not in keyword_actions:
+                    continue
+
+                end = start + length
+                if highlights and start <= highlights[-1][1]:
+                    highlights[-1] = (highlights[-1][0], max(highlights[-1][1], end))
+                else:
+                    highlights.append((start, end))
+
+        return FilteredMessage(
+            text=text,
+            highlights=highlights,
+            muted=MUTE in actions,
+            routed=ROUTE in actions,
+        )
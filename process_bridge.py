@@ -0,0 +1,57 @@
+import asyncio
+
+from utils import create_supervisor
+
+
+async def tag_queue_items(queue, channel, outgoing_queue):
+    while True:
+        outgoing_queue.put_nowait((channel, await queue.get()))
+
+
+async def send_batches(connection, outgoing_queue):
+    while True:
+        batch = [await outgoing_queue.get()]
+        while not outgoing_queue.empty():
+            batch.append(outgoing_queue.get_nowait())
+
+        # sending blocks while the pipe is full, e.g. when the other process
+        # is stalled, so it is done in a thread to keep the event loop running
+        await asyncio.to_thread(connection.send, batch)
+
+
+async def send_queues_to_connection(connection, queues):
+    outgoing_queue = asyncio.Queue()
+
+    async with create_supervisor() as supervisor:
+        for channel, queue in queues.items():
+            supervisor.start_soon(
+                tag_queue_items,
+                queue=queue,
+                channel=channel,
+                outgoing_queue=outgoing_queue,
+            )
+        supervisor.start_soon(
+            send_batches,
+            connection=connection,
+            outgoing_queue=outgoing_queue,
+        )
+
+
+def receive_batch(connection, timeout):
+    if not connection.poll(timeout):
+        return []
+    return connection.recv()
+
+
+async def receive_to_queues(connection, queues, max_waiting_time=0.5):
+    while True:
+        try:
+            # receiving is done in a thread the same way as sending, and waiting
+            # is limited, so that a cancelled receiving does not leave the thread
+            # blocked on the pipe until the other process closes it
+            batch = await asyncio.to_thread(receive_batch, connection, max_waiting_time)
+        except (EOFError, OSError):
+            return
+
+        for channel, item in batch:
+            queues[channel].put_nowait(item)
@@ -0,0 +1,94 @@
+import asyncio
+import collections
+import textwrap
+import time
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        if rate <= 0:
+            raise ValueError(f'rate must be positive, got {rate}')
+        if burst < 1:
+            raise ValueError(f'burst must be at least 1, got {burst}')
+
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    @property
+    def tokens(self):
+        self._refill()
+        return self._tokens
+
+    def get_delay(self, tokens_count=1):
+        return max(0, (tokens_count - self.tokens) / self.rate)
+
+    async def acquire(self):
+        delay = self.get_delay()
+        if delay:
+            await asyncio.sleep(delay)
+
+        self._refill()
+        self._tokens -= 1
+
+
+def split_message(text, max_message_length):
+    chunks = []
+
+    for line in text.splitlines():
+        if len(line) <= max_message_length:
+            chunks.append(line)
+        else:
+            chunks.extend(textwrap.wrap(line, width=max_message_length))
+
+    return [chunk for chunk in chunks if chunk.strip()]
+
+
+def coalesce_messages(messages, max_message_length, separator=' | '):
+    # messages are (text, is_whole_input) pairs, the lines of one split input
+    # are never merged, so that a paste keeps its line boundaries
+    coalesced_messages = []
+
+    for message, is_whole_input in messages:
+        if (is_whole_input and coalesced_messages and coalesced_messages[-1][1] and
+                len(coalesced_messages[-1][0]) + len(separator) + len(message) <=
+                max_message_length):
+            coalesced_messages[-1] = (f'{coalesced_messages[-1][0]}{separator}{message}', True)
+        else:
+            coalesced_messages.append((message, is_whole_input))
+
+    return coalesced_messages
+
+
+class MessageThrottler:
+    def __init__(self, rate=1, burst=5, max_message_length=400):
+        self.max_message_length = max_message_length
+        self.token_bucket = TokenBucket(rate=rate, burst=burst)
+        self.pending_messages = collections.deque()
+
+    def add(self, text):
+        messages = split_message(text, self.max_message_length)
+        is_whole_input = len(messages) == 1
+        self.pending_messages.extend((message, is_whole_input) for message in messages)
+
+    def coalesce_if_throttled(self):
+        # merging is done only if messages would wait anyway,
+        # otherwise each of them is sent as it was entered
+        if len(self.pending_messages) > 1 and self.token_bucket.get_delay():
+            self.pending_messages = collections.deque(
+                coalesce_messages(self.pending_messages, self.max_message_length),
+            )
+
+    def get_estimated_delay(self):
+        return self.token_bucket.get_delay(tokens_count=len(self.pending_messages))
+
+    async def take(self):
+        await self.token_bucket.acquire()
+        message, _ = self.pending_messages.popleft()
+        return message
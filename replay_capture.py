@@ -0,0 +1,397 @@
+import argparse
+import asyncio
+import json
+import os.path
+import statistics
+import sys
+import tempfile
+
+import chat_client
+import gui_chat_client as gui
+from message_filters import MessageFilter
+from rate_limiting import MessageThrottler
+import traffic_capture
+from utils import create_supervisor
+
+
+def load_replayed_streams(capture_filepath):
+    streams = {
+        traffic_capture.READ_CONNECTION_RECEIVED: [],
+        traffic_capture.WRITE_CONNECTION_RECEIVED: [],
+    }
+    capture_started_at = None
+
+    for timestamp, stream, data in traffic_capture.read_capture(capture_filepath):
+        if capture_started_at is None:
+            capture_started_at = timestamp
+
+        if stream in streams:
+            streams[stream].append((timestamp - capture_started_at, data))
+
+    return streams
+
+
+def get_lines_schedule(records, speed):
+    schedule = []
+
+    for offset, data in records:
+        scheduled_offset = offset / speed if speed else 0
+        schedule.extend([scheduled_offset] * data.count(b'\n'))
+
+    return schedule
+
+
+async def replay_records(writer, records, speed):
+    loop = asyncio.get_running_loop()
+    started_at = loop.time()
+
+    for offset, data in records:
+        if speed:
+            delay = started_at + offset / speed - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+        writer.write(data)
+        await writer.drain()
+
+
+async def discard_incoming_data(reader):
+    while await reader.read(64 * 1024):
+        pass
+
+
+def create_replaying_handler(records, speed, on_replay_started=None, handler_tasks=None):
+    async def handle_client(reader, writer):
+        if on_replay_started:
+            on_replay_started()
+
+        if handler_tasks is not None:
+            task = asyncio.current_task()
+            handler_tasks.add(task)
+            task.add_done_callback(handler_tasks.discard)
+
+        try:
+            async with create_supervisor() as supervisor:
+                supervisor.start_soon(
+                    replay_records,
+                    writer=writer,
+                    records=records,
+                    speed=speed,
+                )
+                # the connection stays open after the replay until the client leaves
+                await discard_incoming_data(reader)
+                supervisor.cancel()
+        except* ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    return handle_client
+
+
+async def start_replay_servers(
+        host, read_port, write_port, streams, speed, on_replay_started=None,
+        handler_tasks=None):
+    read_server = await asyncio.start_server(
+        create_replaying_handler(
+            records=streams[traffic_capture.READ_CONNECTION_RECEIVED],
+            speed=speed,
+            on_replay_started=on_replay_started,
+            handler_tasks=handler_tasks,
+        ),
+        host=host,
+        port=read_port,
+    )
+    write_server = await asyncio.start_server(
+        create_replaying_handler(
+            records=streams[traffic_capture.WRITE_CONNECTION_RECEIVED],
+            speed=speed,
+            handler_tasks=handler_tasks,
+        ),
+        host=host,
+        port=write_port,
+    )
+    return read_server, write_server
+
+
+async def consume_displayed_messages(messages_queue, arrival_times, expected_messages_count, done):
+    loop = asyncio.get_running_loop()
+
+    while True:
+        messages = [await messages_queue.get()]
+        while not messages_queue.empty():
+            messages.append(messages_queue.get_nowait())
+
+        # the same work the conversation panel does, except the Tk call itself
+        gui.get_tagged_chunks(messages=messages, start_with_newline=True)
+
+        arrival_times.extend([loop.time()] * len(messages))
+        if len(arrival_times) >= expected_messages_count:
+            done.set()
+
+
+async def count_reconnects(status_updates_queue, reconnects):
+    while True:
+        message = await status_updates_queue.get()
+
+        if message is gui.ReadConnectionStateChanged.INITIATED:
+            reconnects['count'] += 1
+
+
+async def stop_when_done(supervisor, done, max_duration):
+    try:
+        await asyncio.wait_for(done.wait(), max_duration)
+    except asyncio.TimeoutError:
+        pass
+    supervisor.cancel()
+
+
+async def run_pipeline_benchmark(streams, speed, max_duration):
+    loop = asyncio.get_running_loop()
+
+    lines_schedule = get_lines_schedule(
+        records=streams[traffic_capture.READ_CONNECTION_RECEIVED],
+        speed=speed,
+    )
+    replay_start_times = []
+    arrival_times = []
+    reconnects = {'count': 0}
+    done = asyncio.Event()
+    handler_tasks = set()
+
+    read_server, write_server = await start_replay_servers(
+        host='127.0.0.1',
+        read_port=0,
+        write_port=0,
+        streams=streams,
+        speed=speed,
+        on_replay_started=lambda: replay_start_times.append(loop.time()),
+        handler_tasks=handler_tasks,
+    )
+
+    displayed_messages_queue = asyncio.Queue()
+    filtered_messages_queue = asyncio.Queue()
+    routed_messages_queue = asyncio.Queue()
+    written_to_file_messages_queue = asyncio.Queue()
+    sending_messages_queue = asyncio.Queue()
+    status_updates_queue = asyncio.Queue()
+
+    message_filter = MessageFilter()
+
+    with tempfile.TemporaryDirectory() as output_directory:
+        async with read_server, write_server, create_supervisor() as supervisor:
+            supervisor.start_soon(
+                chat_client.handle_connection,
+                host='127.0.0.1',
+                read_port=read_server.sockets[0].getsockname()[1],
+                write_port=write_server.sockets[0].getsockname()[1],
+                auth_token='replayed-token',
+                displayed_messages_queue=displayed_messages_queue,
+                written_to_file_messages_queue=written_to_file_messages_queue,
+                sending_messages_queue=sending_messages_queue,
+                status_updates_queue=status_updates_queue,
+                message_filter=message_filter,
+                message_throttler=MessageThrottler(),
+            )
+            supervisor.start_soon(
+                chat_client.filter_messages,
+                messages_queue=displayed_messages_queue,
+                filtered_messages_queue=filtered_messages_queue,
+                routed_messages_queue=routed_messages_queue,
+                message_filter=message_filter,
+            )
+            supervisor.start_soon(
+                chat_client.save_messages,
+                output_filepath=os.path.join(output_directory, 'chat.txt'),
+                messages_queue=written_to_file_messages_queue,
+            )
+            supervisor.start_soon(
+                consume_displayed_messages,
+                messages_queue=filtered_messages_queue,
+                arrival_times=arrival_times,
+                expected_messages_count=len(lines_schedule),
+                done=done,
+            )
+            supervisor.start_soon(
+                count_reconnects,
+                status_updates_queue=status_updates_queue,
+                reconnects=reconnects,
+            )
+            supervisor.start_soon(
+                stop_when_done,
+                supervisor=supervisor,
+                done=done,
+                max_duration=max_duration,
+            )
+
+    # let the replay server see that the client has left
+    if handler_tasks:
+        await asyncio.wait(handler_tasks, timeout=1)
+
+    if not replay_start_times or not arrival_times:
+        return {'completed': False, 'messages_count': 0}
+
+    replay_started_at = replay_start_times[0]
+    lags = [
+        arrival_time - (replay_started_at + scheduled_offset)
+        for arrival_time, scheduled_offset in zip(arrival_times, lines_schedule)
+    ]
+    elapsed_time = arrival_times[-1] - replay_started_at
+
+    return {
+        'completed': done.is_set(),
+        'speed': speed,
+        'messages_count': len(arrival_times),
+        'elapsed_time': elapsed_time,
+        'throughput': len(arrival_times) / elapsed_time if elapsed_time else 0,
+        'mean_lag': statistics.mean(lags),
+        'p99_lag': sorted(lags)[int(len(lags) * 0.99)],
+        'max_lag': max(lags),
+        # the first connection is not a reconnect
+        'reconnects_count': reconnects['count'] - 1,
+    }
+
+
+def find_regressions(results, baseline, tolerance):
+    regressions = []
+
+    if not results['completed']:
+        regressions.append('replay did not complete')
+        return regressions
+
+    # paced replays are bound by the capture timing, so throughput is
+    # compared only without pauses, where all messages are scheduled at once
+    # and lag is meaningless instead
+    if not results['speed']:
+        if results['throughput'] < baseline['throughput'] * (1 - tolerance):
+            regressions.append(
+                f'throughput {results["throughput"]:,.0f} messages/s, '
+                f'baseline {baseline["throughput"]:,.0f} messages/s',
+            )
+    elif results['p99_lag'] > baseline['p99_lag'] * (1 + tolerance):
+        regressions.append(
+            f'p99 lag {results["p99_lag"] * 1000:.1f}ms, '
+            f'baseline {baseline["p99_lag"] * 1000:.1f}ms',
+        )
+    if results['reconnects_count'] > baseline['reconnects_count']:
+        regressions.append(
+            f'{results["reconnects_count"]} reconnects, '
+            f'baseline {baseline["reconnects_count"]}',
+        )
+
+    return regressions
+
+
+def parse_speed(value):
+    if value == 'max':
+        return 0
+
+    speed = float(value)
+    if speed <= 0:
+        raise argparse.ArgumentTypeError('speed must be positive or "max"')
+    return speed
+
+
+def get_command_line_arguments():
+    parser = argparse.ArgumentParser(
+        description='Replay a chat capture recorded with chat_client.py --capture',
+    )
+    parser.add_argument('capture', help='Path to the capture file')
+    parser.add_argument(
+        '--host', default='127.0.0.1', help='Host for serve replayed chat. Default: 127.0.0.1',
+    )
+    parser.add_argument(
+        '--read-port', type=int, default=5000,
+        help='Port for serve replayed reading connections. Default: 5000',
+    )
+    parser.add_argument(
+        '--write-port', type=int, default=5050,
+        help='Port for serve replayed writing connections. Default: 5050',
+    )
+    parser.add_argument(
+        '--speed', type=parse_speed, default=1,
+        help='Replay speed multiplier, or "max" for replay without pauses. Default: 1',
+    )
+    parser.add_argument(
+        '--benchmark', action='store_true',
+        help='Run the client pipeline against the replay instead of serving it',
+    )
+    parser.add_argument(
+        '--max-duration', type=float, default=300,
+        help='Max duration of benchmark in seconds. Default: 300',
+    )
+    parser.add_argument('--baseline', help='Path to the baseline results for compare with')
+    parser.add_argument('--save-baseline', help='Filepath for save benchmark results')
+    parser.add_argument(
+        '--tolerance', type=float, default=0.1,
+        help='Allowed relative deviation from baseline. Default: 0.1',
+    )
+    return parser.parse_args()
+
+
+async def serve(command_line_arguments, streams):
+    read_server, write_server = await start_replay_servers(
+        host=command_line_arguments.host,
+        read_port=command_line_arguments.read_port,
+        write_port=command_line_arguments.write_port,
+        streams=streams,
+        speed=command_line_arguments.speed,
+    )
+    async with read_server, write_server:
+        await asyncio.gather(read_server.serve_forever(), write_server.serve_forever())
+
+
+async def benchmark(command_line_arguments, streams):
+    results = await run_pipeline_benchmark(
+        streams=streams,
+        speed=command_line_arguments.speed,
+        max_duration=command_line_arguments.max_duration,
+    )
+    print(json.dumps(results, indent=4))
+
+    if command_line_arguments.save_baseline:
+        with open(command_line_arguments.save_baseline, 'w') as file_object:
+            json.dump(results, file_object, indent=4)
+
+    if not command_line_arguments.baseline:
+        return []
+
+    with open(command_line_arguments.baseline) as file_object:
+        baseline = json.load(file_object)
+
+    if results['completed'] and baseline.get('speed') != results['speed']:
+        print(
+            f'Baseline was recorded with speed {baseline.get("speed")}, '
+            f'can not compare with speed {results["speed"]}',
+            file=sys.stderr,
+        )
+        sys.exit(2)
+
+    regressions = find_regressions(
+        results=results,
+        baseline=baseline,
+        tolerance=command_line_arguments.tolerance,
+    )
+    for regression in regressions:
+        print(f'REGRESSION: {regression}', file=sys.stderr)
+
+    return regressions
+
+
+def main():
+    command_line_arguments = get_command_line_arguments()
+
+    streams = load_replayed_streams(command_line_arguments.capture)
+
+    if command_line_arguments.benchmark:
+        if asyncio.run(benchmark(command_line_arguments, streams)):
+            sys.exit(1)
+    else:
+        try:
+            asyncio.run(serve(command_line_arguments, streams))
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main()
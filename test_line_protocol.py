@@ -0,0 +1,107 @@
+import asyncio
+
+import pytest
+
+from line_protocol import LineReaderProtocol, open_connection
+
+
+class FakeTransport:
+    def __init__(self):
+        self.reading_paused = False
+
+    def get_extra_info(self, name, default=None):
+        return default
+
+    def pause_reading(self):
+        self.reading_paused = True
+
+    def resume_reading(self):
+        self.reading_paused = False
+
+
+def create_protocol(**kwargs):
+    protocol = LineReaderProtocol(**kwargs)
+    protocol.connection_made(FakeTransport())
+    return protocol
+
+
+def test_lines_split_across_chunks():
+    protocol = create_protocol()
+
+    for chunk in [b'hel', b'lo\nwor', b'ld\n', b'\n', b'tail']:
+        protocol.data_received(chunk)
+
+    assert asyncio.run(protocol.readlines()) == [b'hello\n', b'world\n', b'\n']
+
+    protocol.data_received(b'\n')
+    assert asyncio.run(protocol.readline()) == b'tail\n'
+
+
+def test_complete_oversized_line_is_truncated():
+    protocol = create_protocol(max_line_length=4)
+
+    protocol.data_received(b'ok\nabcdefgh\nxy\n')
+
+    assert asyncio.run(protocol.readlines()) == [b'ok\n', b'abcd\n', b'xy\n']
+
+
+def test_oversized_line_split_across_chunks_is_truncated_once():
+    protocol = create_protocol(max_line_length=4)
+
+    for chunk in [b'abc', b'defgh', b'ijk', b'l\nxy\n']:
+        protocol.data_received(chunk)
+
+    assert asyncio.run(protocol.readlines()) == [b'abcd\n', b'xy\n']
+
+
+def test_reading_is_paused_while_too_many_lines_are_pending():
+    protocol = create_protocol(max_pending_lines_count=2)
+
+    protocol.data_received(b'a\nb\n')
+    assert protocol.transport.reading_paused
+
+    asyncio.run(protocol.readline())
+    assert not protocol.transport.reading_paused
+
+
+def test_concurrent_reads_are_refused():
+    async def run():
+        protocol = create_protocol()
+        waiting_task = asyncio.create_task(protocol.readline())
+        await asyncio.sleep(0)
+
+        with pytest.raises(RuntimeError):
+            await protocol.readline()
+
+        protocol.data_received(b'line\n')
+        return await waiting_task
+
+    assert asyncio.run(run()) == b'line\n'
+
+
+def test_connection_closed_by_server():
+    async def close_after_greeting(reader, writer):
+        writer.write(b'greeting\n')
+        await writer.drain()
+        writer.close()
+
+    async def run():
+        server = await asyncio.start_server(close_after_greeting, host='127.0.0.1', port=0)
+        async with server:
+            reader, writer = await open_connection(
+                host='127.0.0.1',
+                port=server.sockets[0].getsockname()[1],
+            )
+            try:
+                assert await reader.readline() == b'greeting\n'
+                assert await reader.readline() == b''
+
+                # the transport is closed right after the end of the incoming data
+                await asyncio.sleep(0.1)
+                writer.write(b'message\n')
+                with pytest.raises(ConnectionResetError):
+                    await writer.drain()
+            finally:
+                writer.close()
+
+    asyncio.run(run())
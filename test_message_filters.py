@@ -0,0 +1,32 @@
+from message_filters import MessageFilter
+
+
+def test_overlapping_keywords_are_matched():
+    message_filter = MessageFilter(highlighted=['nickname'], muted=['name'], routed=['kna'])
+
+    filtered_message = message_filter.apply('Hello, NICKNAME!')
+
+    assert filtered_message.highlights == [(7, 15)]
+    assert filtered_message.muted
+    assert filtered_message.routed
+
+
+def test_same_nickname_is_not_compiled_again():
+    message_filter = MessageFilter(highlighted=['python'])
+    message_filter.set_nickname('Alice')
+    matcher = message_filter._matcher
+
+    message_filter.set_nickname('alice')
+
+    assert message_filter._matcher is matcher
+
+
+def test_nickname_change_keeps_watchlist_keywords():
+    message_filter = MessageFilter(highlighted=['alice'], muted=['bob'])
+    message_filter.set_nickname('alice')
+    message_filter.set_nickname('bob')
+
+    filtered_message = message_filter.apply('alice and bob')
+
+    assert filtered_message.highlights == [(0, 5), (10, 13)]
+    assert filtered_message.muted
@@ -0,0 +1,50 @@
+import asyncio
+import multiprocessing
+
+from process_bridge import receive_to_queues, send_queues_to_connection
+from utils import create_supervisor
+
+
+def test_queue_items_are_passed_through_pipe(items_count=1000):
+    async def run():
+        sending_connection, receiving_connection = multiprocessing.Pipe()
+        outgoing_queues = {'display': asyncio.Queue(), 'status': asyncio.Queue()}
+        incoming_queues = {'display': asyncio.Queue(), 'status': asyncio.Queue()}
+
+        for item in range(items_count):
+            outgoing_queues['display'].put_nowait(item)
+        outgoing_queues['status'].put_nowait('done')
+
+        async with create_supervisor() as supervisor:
+            supervisor.start_soon(
+                send_queues_to_connection,
+                connection=sending_connection,
+                queues=outgoing_queues,
+            )
+            supervisor.start_soon(
+                receive_to_queues,
+                connection=receiving_connection,
+                queues=incoming_queues,
+            )
+            displayed_items = [
+                await incoming_queues['display'].get() for _ in range(items_count)
+            ]
+            status = await incoming_queues['status'].get()
+            supervisor.cancel()
+
+        return displayed_items, status
+
+    assert asyncio.run(run()) == (list(range(items_count)), 'done')
+
+
+def test_receiving_stops_when_other_side_is_closed():
+    async def run():
+        sending_connection, receiving_connection = multiprocessing.Pipe()
+        sending_connection.send([('display', 'last message')])
+        sending_connection.close()
+
+        queues = {'display': asyncio.Queue()}
+        await asyncio.wait_for(receive_to_queues(receiving_connection, queues), 5)
+        return queues['display'].get_nowait()
+
+    assert asyncio.run(run()) == 'last message'
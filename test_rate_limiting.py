@@ -0,0 +1,116 @@
+import asyncio
+
+import pytest
+
+import rate_limiting
+from rate_limiting import MessageThrottler, TokenBucket, coalesce_messages, split_message
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+    async def sleep(self, delay):
+        self.now += delay
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake_clock = FakeClock()
+    monkeypatch.setattr(rate_limiting.time, 'monotonic', fake_clock.monotonic)
+    monkeypatch.setattr(rate_limiting.asyncio, 'sleep', fake_clock.sleep)
+    return fake_clock
+
+
+def test_burst_is_sent_at_once_then_paced_by_rate(clock):
+    token_bucket = TokenBucket(rate=2, burst=3)
+
+    async def acquire_all(tokens_count):
+        acquired_at = []
+        for _ in range(tokens_count):
+            await token_bucket.acquire()
+            acquired_at.append(clock.now)
+        return acquired_at
+
+    assert asyncio.run(acquire_all(6)) == pytest.approx([0, 0, 0, 0.5, 1, 1.5])
+
+
+def test_tokens_are_refilled_up_to_burst(clock):
+    token_bucket = TokenBucket(rate=1, burst=2)
+    asyncio.run(token_bucket.acquire())
+    asyncio.run(token_bucket.acquire())
+
+    clock.now += 10
+
+    assert token_bucket.tokens == 2
+    assert token_bucket.get_delay(tokens_count=3) == pytest.approx(1)
+
+
+@pytest.mark.parametrize('rate, burst', [(0, 1), (-1, 1), (1, 0)])
+def test_invalid_token_bucket_is_rejected(rate, burst):
+    with pytest.raises(ValueError):
+        TokenBucket(rate=rate, burst=burst)
+
+
+def test_split_message():
+    assert split_message('short', max_message_length=10) == ['short']
+    assert split_message('first\n\n  \nsecond\n', max_message_length=10) == ['first', 'second']
+    assert split_message('one two three four', max_message_length=9) == [
+        'one two', 'three', 'four',
+    ]
+
+
+def test_coalesce_messages_keeps_split_lines_apart():
+    messages = [
+        ('hi', True),
+        ('line one', False),
+        ('line two', False),
+        ('a', True),
+        ('b', True),
+        ('c' * 10, True),
+    ]
+
+    assert coalesce_messages(messages, max_message_length=12) == [
+        ('hi', True),
+        ('line one', False),
+        ('line two', False),
+        ('a | b', True),
+        ('c' * 10, True),
+    ]
+
+
+def test_messages_are_coalesced_only_when_throttled(clock):
+    message_throttler = MessageThrottler(rate=1, burst=1, max_message_length=40)
+    message_throttler.add('first')
+    message_throttler.add('second')
+
+    message_throttler.coalesce_if_throttled()
+    assert len(message_throttler.pending_messages) == 2
+
+    asyncio.run(message_throttler.take())
+    message_throttler.add('third')
+
+    message_throttler.coalesce_if_throttled()
+    assert asyncio.run(message_throttler.take()) == 'second | third'
+
+
+def test_paste_lines_are_never_merged(clock):
+    message_throttler = MessageThrottler(rate=1, burst=1, max_message_length=40)
+    message_throttler.add('first')
+    asyncio.run(message_throttler.take())
+
+    message_throttler.add('before')
+    message_throttler.add('line one\nline two\nline three')
+    message_throttler.add('after')
+    message_throttler.coalesce_if_throttled()
+
+    async def take_all():
+        return [
+            await message_throttler.take()
+            for _ in range(len(message_throttler.pending_messages))
+        ]
+
+    assert asyncio.run(take_all()) == ['before', 'line one', 'line two', 'line three', 'after']
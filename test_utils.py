@@ -0,0 +1,167 @@
+import argparse
+import asyncio
+import time
+
+import pytest
+
+from utils import (
+    RestartPolicy, create_supervisor, parse_non_negative_int, parse_positive_float,
+    parse_positive_int,
+)
+
+
+async def sleep_forever():
+    await asyncio.sleep(3600)
+
+
+async def fail_soon(exception, delay=0.01):
+    await asyncio.sleep(delay)
+    raise exception
+
+
+def test_single_failure_is_unwrapped_and_cancels_siblings():
+    sibling_cancelled = False
+
+    async def wait_for_cancellation():
+        nonlocal sibling_cancelled
+        try:
+            await sleep_forever()
+        except asyncio.CancelledError:
+            sibling_cancelled = True
+            raise
+
+    async def run():
+        async with create_supervisor() as supervisor:
+            supervisor.start_soon(wait_for_cancellation)
+            supervisor.start_soon(fail_soon, KeyError('boom'))
+
+    with pytest.raises(KeyError):
+        asyncio.run(run())
+    assert sibling_cancelled
+
+
+def test_simultaneous_failures_are_raised_as_group():
+    async def run():
+        async with create_supervisor() as supervisor:
+            supervisor.start_soon(fail_soon, KeyError('first'), delay=0)
+            supervisor.start_soon(fail_soon, ValueError('second'), delay=0)
+
+    with pytest.raises(ExceptionGroup) as exc_info:
+        asyncio.run(run())
+    assert {type(exc) for exc in exc_info.value.exceptions} == {KeyError, ValueError}
+
+
+def test_restart_policy_restarts_until_success():
+    calls_count = 0
+
+    async def fail_twice():
+        nonlocal calls_count
+        calls_count += 1
+        if calls_count < 3:
+            raise OSError()
+        return 'done'
+
+    async def run():
+        async with create_supervisor() as supervisor:
+            task = supervisor.start_soon(
+                fail_twice,
+                restart_policy=RestartPolicy(restart_on=(OSError,)),
+            )
+        return task.result()
+
+    assert asyncio.run(run()) == 'done'
+    assert calls_count == 3
+
+
+def test_restart_policy_gives_up_after_max_restarts():
+    calls_count = 0
+
+    async def always_fail():
+        nonlocal calls_count
+        calls_count += 1
+        raise OSError()
+
+    async def run():
+        async with create_supervisor() as supervisor:
+            supervisor.start_soon(
+                always_fail,
+                restart_policy=RestartPolicy(restart_on=(OSError,), max_restarts=2),
+            )
+
+    with pytest.raises(OSError):
+        asyncio.run(run())
+    assert calls_count == 3
+
+
+def test_restart_policy_does_not_restart_other_exceptions():
+    calls_count = 0
+
+    async def fail_with_key_error():
+        nonlocal calls_count
+        calls_count += 1
+        raise KeyError()
+
+    async def run():
+        async with create_supervisor() as supervisor:
+            supervisor.start_soon(
+                fail_with_key_error,
+                restart_policy=RestartPolicy(restart_on=(OSError,)),
+            )
+
+    with pytest.raises(KeyError):
+        asyncio.run(run())
+    assert calls_count == 1
+
+
+def test_cancel_stops_all_tasks_without_error():
+    async def run():
+        async with create_supervisor() as supervisor:
+            tasks = [supervisor.start_soon(sleep_forever) for _ in range(10)]
+            await asyncio.sleep(0)
+            supervisor.cancel()
+        return tasks
+
+    tasks = asyncio.run(run())
+    assert all(task.cancelled() for task in tasks)
+
+
+def test_cancel_teardown_latency(tasks_count=1000, max_teardown_time=0.5):
+    async def run():
+        async with create_supervisor() as supervisor:
+            for _ in range(tasks_count):
+                supervisor.start_soon(sleep_forever)
+            await asyncio.sleep(0)
+
+            started_at = time.perf_counter()
+            supervisor.cancel()
+        return time.perf_counter() - started_at
+
+    assert asyncio.run(run()) < max_teardown_time
+
+
+def test_failure_teardown_latency(tasks_count=1000, max_teardown_time=0.5):
+    async def run():
+        started_at = time.perf_counter()
+        try:
+            async with create_supervisor() as supervisor:
+                for _ in range(tasks_count):
+                    supervisor.start_soon(sleep_forever)
+                supervisor.start_soon(fail_soon, KeyError(), delay=0)
+        except KeyError:
+            pass
+        return time.perf_counter() - started_at
+
+    assert asyncio.run(run()) < max_teardown_time
+
+
+def test_numeric_argument_parsers():
+    assert parse_positive_int('1') == 1
+    assert parse_non_negative_int('0') == 0
+    assert parse_positive_float('0.5') == 0.5
+
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_positive_int('0')
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_non_negative_int('-1')
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_positive_float('0')
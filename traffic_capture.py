@@ -0,0 +1,66 @@
+import asyncio
+import functools
+import json
+import struct
+import time
+
+
+CAPTURE_FILE_HEADER = b'CHATCAP1'
+
+# timestamp, stream, payload length
+RECORD_HEADER = struct.Struct('<dBI')
+
+READ_CONNECTION_RECEIVED = 0
+WRITE_CONNECTION_RECEIVED = 1
+
+REDACTED_PROMPT = b'[authorisation prompt is not captured]\n'
+
+
+class InvalidCaptureFile(Exception):
+    pass
+
+
+def pack_record(timestamp, stream, data):
+    return RECORD_HEADER.pack(timestamp, stream, len(data)) + data
+
+
+class TrafficRecorder:
+    def __init__(self):
+        self.records_queue = asyncio.Queue()
+
+    def record(self, stream, data):
+        self.records_queue.put_nowait(pack_record(time.time(), stream, bytes(data)))
+
+    def get_recording_callback(self, stream):
+        return functools.partial(self.record, stream)
+
+    def record_redacted_authorisation(self, stream, user_credentials):
+        # the replayed client only needs the same count of lines
+        redacted_user_credentials = dict(user_credentials, account_hash='redacted')
+
+        self.record(
+            stream,
+            REDACTED_PROMPT +
+            f'{json.dumps(redacted_user_credentials)}\n'.encode() +
+            REDACTED_PROMPT,
+        )
+
+
+def read_capture(filepath):
+    with open(filepath, 'rb') as file_object:
+        if file_object.read(len(CAPTURE_FILE_HEADER)) != CAPTURE_FILE_HEADER:
+            raise InvalidCaptureFile(f'{filepath} is not a chat capture file')
+
+        while True:
+            record_header = file_object.read(RECORD_HEADER.size)
+            if not record_header:
+                return
+            if len(record_header) < RECORD_HEADER.size:
+                raise InvalidCaptureFile(f'{filepath} is truncated')
+
+            timestamp, stream, length = RECORD_HEADER.unpack(record_header)
+            data = file_object.read(length)
+            if len(data) < length:
+                raise InvalidCaptureFile(f'{filepath} is truncated')
+
+            yield timestamp, stream, data
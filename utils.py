@@ -1,14 +1,60 @@
+import argparse
+import asyncio
 from contextlib import asynccontextmanager
 
-from aionursery import Nursery, MultiError
+
+class RestartPolicy:
+    def __init__(self, restart_on=(Exception,), max_restarts=None, delay=0):
+        self.restart_on = restart_on
+        self.max_restarts = max_restarts
+        self.delay = delay
+
+
+class Supervisor:
+    def __init__(self, task_group):
+        self._task_group = task_group
+        self._tasks = set()
+
+    def start_soon(self, coroutine_function, *args, restart_policy=None, **kwargs):
+        if restart_policy is None:
+            coroutine = coroutine_function(*args, **kwargs)
+        else:
+            coroutine = run_with_restarts(
+                coroutine_function, args, kwargs, restart_policy,
+            )
+
+        task = self._task_group.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+        return task
+
+    def cancel(self):
+        for task in self._tasks:
+            task.cancel()
+
+
+async def run_with_restarts(coroutine_function, args, kwargs, restart_policy):
+    restarts_count = 0
+
+    while True:
+        try:
+            return await coroutine_function(*args, **kwargs)
+        except restart_policy.restart_on:
+            if (restart_policy.max_restarts is not None and
+                    restarts_count >= restart_policy.max_restarts):
+                raise
+            restarts_count += 1
+
+        await asyncio.sleep(restart_policy.delay)
 
 
 @asynccontextmanager
-async def create_handy_nursery():
+async def create_supervisor():
     try:
-        async with Nursery() as nursery:
-            yield nursery
-    except MultiError as e:
+        async with asyncio.TaskGroup() as task_group:
+            yield Supervisor(task_group)
+    except BaseExceptionGroup as e:
         if len(e.exceptions) == 1:
             raise e.exceptions[0]
         raise
@@ -16,3 +62,24 @@ async def create_handy_nursery():
 
 def get_sanitized_text(text):
     return text.replace('\n', '')
+
+
+def parse_positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f'{value} is not a positive integer')
+    return number
+
+
+def parse_non_negative_int(value):
+    number = int(value)
+    if number < 0:
+        raise argparse.ArgumentTypeError(f'{value} is not a non-negative integer')
+    return number
+
+
+def parse_positive_float(value):
+    number = float(value)
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f'{value} is not a positive number')
+    return number